@@ -4,17 +4,147 @@ from __future__ import annotations
 from odoo import http, tools, _
 from odoo.http import request
 
+from ..utils import _normalize_store
+
 import json
 import time
+import atexit
+import hashlib
+import functools
+import threading
+import unicodedata
+import uuid
 import re as re_std
 import logging
-from typing import Dict, List, Tuple, Optional, Callable, Any
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, List, Tuple, Optional, Callable, Any, Iterator
 
 _logger = logging.getLogger(__name__)
 
+# Provider SDKs are optional at import time; adapters report a missing library
+try:
+    import openai
+except ImportError:
+    openai = None
+try:
+    import httpx
+    from google import genai
+    from google.genai import types as genai_types
+except ImportError:
+    httpx = genai = genai_types = None
+
+# Faster JSON encoding for streamed frames when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional shared rate limiter across workers/nodes
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Third-party `regex` adds a per-search timeout; without it the admin regex is not run
+try:
+    import regex as regex_safe
+except ImportError:
+    regex_safe = None
+
+# -----------------------------------------------------------------------------
+# Caching layer (bounded LRU with TTL, shared by all threads of a worker)
+_QA_CACHE: "OrderedDict[str, Tuple[float, Dict[str, object]]]" = OrderedDict()
+_QA_CACHE_LOCK = threading.Lock()
+QA_CACHE_MAX_ENTRIES = 2048
+QA_CACHE_TTL_SECS = 600
+
+def _canonical_question(question: str) -> str:
+    """Case, spacing and trailing ?!. don't change the answer: 'Opening hours?' == 'opening  hours'.
+    Inner punctuation is kept: 'C++', 'C#' and '3+2' vs '3-2' mean different things."""
+    return " ".join(question.casefold().split()).rstrip("?!. ")
+
+def _history_digest(history: List[Dict[str, Any]]) -> str:
+    """Stable digest of the prior conversation ('' when there is none)."""
+    if not history:
+        return ""
+    raw = json.dumps(history, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def _qa_cache_key(cfg: Dict[str, Any], question: str, history: List[Dict[str, Any]]) -> str:
+    """Key replies by everything that shapes them: config, prior history and the question."""
+    raw = "\x1f".join((
+        (cfg.get("provider") or "").strip(),
+        (cfg.get("model") or "").strip(),
+        cfg.get("system_prompt") or "",
+        cfg.get("file_store_id") or "",
+        repr(cfg.get("temperature")),
+        repr(cfg.get("max_tokens")),
+        _history_digest(history),
+        _canonical_question(question),
+    ))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def _qa_cache_get(key: str) -> Optional[Dict[str, object]]:
+    now = time.monotonic()
+    with _QA_CACHE_LOCK:
+        hit = _QA_CACHE.get(key)
+        if hit is None:
+            return None
+        expires_at, value = hit
+        if expires_at < now:
+            del _QA_CACHE[key]
+            return None
+        _QA_CACHE.move_to_end(key)
+        return value
+
+def _qa_cache_put(key: str, value: Dict[str, object], ttl: int = QA_CACHE_TTL_SECS,
+                  max_entries: int = QA_CACHE_MAX_ENTRIES) -> None:
+    with _QA_CACHE_LOCK:
+        _QA_CACHE[key] = (time.monotonic() + ttl, value)
+        _QA_CACHE.move_to_end(key)
+        while len(_QA_CACHE) > max_entries:
+            _QA_CACHE.popitem(last=False)
+
+# -----------------------------------------------------------------------------
+# In-flight de-duplication: concurrent identical turns share one provider call
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def _ask_coalesced(key: str, fn: Callable[[], str], timeout: Optional[float] = None) -> str:
+    """Run fn() once per key at a time; callers arriving meanwhile wait for its result."""
+    if not key:
+        return fn()
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        leader = fut is None
+        if leader:
+            fut = _INFLIGHT[key] = Future()
+    if not leader:
+        return fut.result(timeout=timeout)
+    try:
+        result = fn()
+        fut.set_result(result)
+        return result
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
 # -----------------------------------------------------------------------------
-# Caching layer
-_QA_CACHE: Dict[str, Dict[str, object]] = {}
+# Provider calls run on a bounded pool so a stalled upstream costs the request
+# its deadline, not an open-ended block of the HTTP worker.
+_PROVIDER_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="ai-chat-provider")
+
+def _run_with_deadline(fn: Callable[[], str], timeout: float) -> str:
+    fut = _PROVIDER_POOL.submit(fn)
+    try:
+        return fut.result(timeout=timeout)
+    except FuturesTimeoutError:
+        fut.cancel()
+        raise
 
 # -----------------------------------------------------------------------------
 # In-memory rate limit (per IP)
@@ -23,78 +153,202 @@ RATE_WINDOW_SECS = 5
 RATE_MAX_CALLS = 1
 
 def _client_ip() -> str:
+    """Client address, parsed once per request (first X-Forwarded-For hop, else the peer)."""
+    ip = getattr(request, "_ai_chat_client_ip", None)
+    if ip:
+        return ip
     try:
-        return request.httprequest.headers.get("X-Forwarded-For", "").split(",")[0].strip() or \
+        ip = request.httprequest.headers.get("X-Forwarded-For", "").partition(",")[0].strip() or \
             request.httprequest.remote_addr or "0.0.0.0"
     except Exception:
-        return "0.0.0.0"
+        ip = "0.0.0.0"
+    request._ai_chat_client_ip = ip
+    return ip
+
+_REDIS_CLIENTS: Dict[str, Any] = {}
+_REDIS_LOCK = threading.Lock()
+_REDIS_RETRY_SECS = 30
+_redis_down_until = 0.0
+
+def _redis_client(url: str):
+    with _REDIS_LOCK:
+        client = _REDIS_CLIENTS.get(url)
+        if client is None:
+            client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+            _REDIS_CLIENTS[url] = client
+        return client
+
+def _throttle_redis(url: str, ip: str, now: float, max_calls: int, window: int) -> Optional[bool]:
+    """Sliding window in a Redis sorted set shared by every worker; None when Redis is unreachable."""
+    global _redis_down_until
+    if now < _redis_down_until:
+        return None
+    key = "ai_chat:rl:%s:%s" % (request.env.cr.dbname, ip)
+    member = uuid.uuid4().hex
+    try:
+        client = _redis_client(url)
+        pipe = client.pipeline()  # MULTI/EXEC: trim, count and record atomically
+        pipe.zremrangebyscore(key, 0, now - window)
+        pipe.zcard(key)
+        pipe.zadd(key, {member: now})
+        pipe.expire(key, window)
+        _, count, _, _ = pipe.execute()
+        if count >= max_calls:
+            # Rejected calls don't use up the window, same as the local buckets
+            client.zrem(key, member)
+            return False
+    except Exception as e:
+        # Don't pay the connect timeout on every message while Redis is down
+        _redis_down_until = now + _REDIS_RETRY_SECS
+        _logger.warning("AI chat: Redis rate limiter unavailable, using local buckets: %s", tools.ustr(e))
+        return None
+    return True
 
-def _throttle() -> bool:
-    """Token-bucket style throttle per client IP."""
+def _throttle(cfg: Dict[str, Any]) -> bool:
+    """Per client IP throttle: shared via Redis when configured, else per-worker buckets."""
     now = time.time()
     ip = _client_ip()
+    max_calls, window = cfg["rate_limit_max"], cfg["rate_limit_window"]
+    if cfg["redis_url"] and redis is not None:
+        allowed = _throttle_redis(cfg["redis_url"], ip, now, max_calls, window)
+        if allowed is not None:
+            return allowed
     bucket = _RATE_BUCKETS.setdefault(ip, [])
-    cutoff = now - RATE_WINDOW_SECS
+    cutoff = now - window
     while bucket and bucket[0] < cutoff:
         bucket.pop(0)
-    if len(bucket) >= RATE_MAX_CALLS:
+    if len(bucket) >= max_calls:
         return False
     bucket.append(now)
     return True
 
+# -----------------------------------------------------------------------------
+# Access
+def _user_can_use_chat() -> bool:
+    """Chat users, or admins (who imply the user group, so the second lookup rarely runs)."""
+    user = request.env.user
+    return bool(
+        user.has_group('website_ai_chat_min.group_ai_chat_user')
+        or user.has_group('website_ai_chat_min.group_ai_chat_admin')
+    )
+
 # -----------------------------------------------------------------------------
 # Config access
 def _icp():
     return request.env["ir.config_parameter"].sudo()
 
-def _get_icp_param(name: str, default: str = "") -> str:
+def _get_icp_params(prefix: str) -> Dict[str, str]:
+    """All parameters under prefix in one query (instead of one get_param per key).
+    Errors propagate: a failed read must not be cached as an all-defaults config."""
+    rows = _icp().search_read([("key", "=like", prefix + "%")], ["key", "value"])
+    return {row["key"]: row["value"] for row in rows}
+
+def _get_icp_param(name: str, default: str = "", params: Optional[Dict[str, str]] = None) -> str:
+    if params is not None:
+        return params.get(name) or default
     try:
         return _icp().get_param(name, default) or default
     except Exception:
         return default
 
-# -----------------------------------------------------------------------------
-# Store helpers (normalize + fetch from ICP)
-def _normalize_store(name: str) -> str:
-    """
-    Ensure we always use a fully-qualified File Search Store name.
-    Valid form is: fileSearchStores/<id>
-    """
-    name = (name or "").strip()
-    return name if (not name or name.startswith("fileSearchStores/")) else f"fileSearchStores/{name}"
+def _get_icp_number(name: str, default, cast=int, params: Optional[Dict[str, str]] = None):
+    try:
+        return cast(_get_icp_param(name, "", params=params) or default)
+    except (TypeError, ValueError):
+        return default
 
 # -----------------------------------------------------------------------------
 # Allowed-scope regex (admin-controlled)
+@functools.lru_cache(maxsize=8)
+def _compile_allowed(pattern: str):
+    """Compile the admin regex once per distinct pattern; None if it does not compile
+    or cannot be run safely."""
+    if regex_safe is None:
+        # `re` has no timeout and the save-time check can't catch every slow
+        # pattern ((a|aa)+$ passes it), so refuse rather than risk a hung worker
+        _logger.error("AI chat: 'regex' is not installed; refusing to evaluate the allowed regex")
+        return None
+    try:
+        return regex_safe.compile(pattern, flags=regex_safe.I | regex_safe.M)
+    except Exception:
+        _logger.warning("AI chat: allowed regex does not compile: %r", pattern)
+        return None
+
 def _match_allowed(pattern: str, text: str, timeout_ms: int = 120) -> bool:
-    """Return True if text matches admin regex. Fail-closed if regex library missing."""
+    """Return True if text matches admin regex. Fail-closed if the regex is invalid or too slow."""
     if not pattern:
         return True
+    compiled = _compile_allowed(pattern)
+    if compiled is None:
+        return False
     try:
-        try:
-            import regex as regex_safe
-        except Exception:
-            regex_safe = None
-        if regex_safe:
-            return bool(regex_safe.search(pattern, text, flags=regex_safe.I | regex_safe.M, timeout=timeout_ms))
-        return bool(re_std.search(pattern, text, flags=re_std.I | re_std.M))
+        return bool(compiled.search(text, timeout=timeout_ms / 1000.0))
     except Exception:
         return False
 
+_WORD_RE = re_std.compile(r"\w+")
+
+def _question_in_scope(cfg: Dict[str, Any], text: str) -> bool:
+    """Whole-word keyword hit first (a set lookup), then the admin regex if any."""
+    keywords = cfg["allowed_keywords"]
+    if keywords and not keywords.isdisjoint(_WORD_RE.findall(text.casefold())):
+        return True
+    return bool(cfg["allowed_regex"]) and _match_allowed(cfg["allowed_regex"], text)
+
 # -----------------------------------------------------------------------------
 # PII redaction
+_EMAIL_RE = re_std.compile(r"([A-Za-z0-9._%+-]+)@([A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+_PHONE_RE = re_std.compile(r"\+?\d[\d\s().-]{6,}\d")
+_SIMPLE_ID_RE = re_std.compile(r"\b[A-Za-z0-9]{8,12}\b")
+
 def _redact_pii(text: str) -> str:
-    try:
-        if not text:
-            return text
-        text = re_std.sub(r"([A-Za-z0-9._%+-]+)@([A-Za-z0-9.-]+\.[A-Za-z]{2,})", r"***@***", text)
-        text = re_std.sub(r"\+?\d[\d\s().-]{6,}\d", "***", text)  # phones
-        text = re_std.sub(r"\b[A-Za-z0-9]{8,12}\b", "***", text)  # simple IDs
+    if not text:
         return text
-    except Exception:
+    text = _EMAIL_RE.sub("***@***", text)
+    text = _PHONE_RE.sub("***", text)  # phones
+    text = _SIMPLE_ID_RE.sub("***", text)  # simple IDs
+    return text
+
+# -----------------------------------------------------------------------------
+# Input compaction (fewer input tokens, same meaning)
+# Only real markup: a known tag name, then name="value" attributes. 'a<b and c>d'
+# or '3 < 5 > 2' is not a tag and must survive.
+_HTML_TAG_NAMES = (
+    "a|abbr|article|b|blockquote|br|button|caption|code|col|colgroup|dd|del|div|dl|dt|em|"
+    "figcaption|figure|font|footer|form|h[1-6]|header|hr|i|img|input|ins|kbd|label|li|mark|"
+    "nav|ol|p|pre|q|s|section|small|span|strike|strong|sub|sup|table|tbody|td|tfoot|th|"
+    "thead|tr|u|ul"
+)
+_HTML_TAG_RE = re_std.compile(
+    r"<!--.*?-->"
+    r"|</?(?:" + _HTML_TAG_NAMES + r")"
+    r"(?:\s+[A-Za-z_:][\w:.-]*\s*=\s*(?:\"[^\"<>]*\"|'[^'<>]*'|[^\s\"'<>=`]+))*\s*/?>",
+    re_std.S | re_std.I,
+)
+# ZWSP, word joiner and BOM only: ZWNJ/ZWJ spell Persian, Indic and emoji sequences
+_ZERO_WIDTH_RE = re_std.compile("[\u200b\u2060\ufeff]")
+_HSPACE_RE = re_std.compile(r"[ \t\f\v]+")
+_LINE_EDGES_RE = re_std.compile(r" ?\n ?")
+_BLANK_LINES_RE = re_std.compile(r"\n{3,}")
+
+def _compact_question(text: str) -> str:
+    """Drop markup and zero-width noise pasted into the box; collapse whitespace, keep paragraphs."""
+    if not text:
         return text
+    # NFC only: NFKC would fold 'x²' to 'x2' and change what was asked
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _ZERO_WIDTH_RE.sub("", text)
+    text = _HTML_TAG_RE.sub(" ", text)
+    text = _HSPACE_RE.sub(" ", text)
+    text = _LINE_EDGES_RE.sub("\n", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
 
 # -----------------------------------------------------------------------------
 # Prompt composition
+# Output tokens dominate provider latency; ask for short answers by default.
+AI_BREVITY_DIRECTIVE = "Be concise; answer in under 120 words unless the user explicitly asks for detail."
+
 def _build_system_preamble(system_prompt: str, snippets: List[Tuple[str, int, str]]) -> str:
     """Build the final system message (today: just the configured system prompt)."""
     lines: List[str] = []
@@ -103,6 +357,7 @@ def _build_system_preamble(system_prompt: str, snippets: List[Tuple[str, int, st
         lines.append(base)
     else:
         lines.append("Be concise and helpful. Use markdown when formatting lists or steps. Your reply should be in human-readable format.")
+    lines.append(AI_BREVITY_DIRECTIVE)
     return "\n\n".join(lines)
 
 # -----------------------------------------------------------------------------
@@ -118,155 +373,342 @@ class _ProviderBase:
     def ask(self, system_text: str, user_text: str) -> str:
         raise NotImplementedError
 
-    def _with_retries(self, fn: Callable[[], str], tries: int = 2) -> str:
+    def stream(self, system_text: str, user_text: str) -> Iterator[str]:
+        """Yield the reply as it is generated (adapters without streaming yield it whole)."""
+        yield self.ask(system_text, user_text)
+
+    def _with_retries(self, fn: Callable[[float], str], tries: int = 2) -> str:
+        """Call fn(remaining_secs) until it succeeds; all attempts share self.timeout,
+        so no call outlives the deadline the user was given."""
         last = None
-        for _ in range(max(1, tries)):
+        tries = max(1, tries)
+        deadline = time.monotonic() + self.timeout
+        for attempt in range(tries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                return fn()
+                return fn(remaining)
             except Exception as e:
                 last = e
-                time.sleep(0.4)
+                if attempt + 1 < tries:
+                    delay = self._retry_delay(e, attempt)
+                    if time.monotonic() + delay >= deadline:
+                        break
+                    time.sleep(delay)
         raise last or RuntimeError("provider failed")
 
-class _OpenAIProvider(_ProviderBase):
-    def ask(self, system_text: str, user_text: str) -> str:
+    @staticmethod
+    def _retry_delay(exc: Exception, attempt: int) -> float:
+        """Exponential backoff, honouring a provider Retry-After header (capped)."""
+        delay = 0.4 * (2 ** attempt)
+        headers = getattr(getattr(exc, "response", None), "headers", None)
         try:
-            import openai
-        except Exception:
-            return "The OpenAI client library is not installed on the server."
-        openai.api_key = self.api_key
+            if headers and headers.get("retry-after"):
+                delay = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        return min(max(delay, 0.0), 4.0)
+
+# One OpenAI client per API key and worker: the SDK keeps an httpx connection
+# pool per client, so reusing it saves a TCP + TLS handshake on every message.
+_OPENAI_CLIENTS: Dict[str, Any] = {}
+_OPENAI_LOCK = threading.Lock()
+
+def _openai_client(api_key: str):
+    with _OPENAI_LOCK:
+        client = _OPENAI_CLIENTS.get(api_key)
+        if client is None:
+            # Retries are ours (_with_retries), bounded by the turn's budget
+            client = openai.OpenAI(api_key=api_key, max_retries=0)
+            _OPENAI_CLIENTS[api_key] = client
+        return client
+
+def _close_openai_clients() -> None:
+    with _OPENAI_LOCK:
+        for client in _OPENAI_CLIENTS.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _OPENAI_CLIENTS.clear()
+
+atexit.register(_close_openai_clients)
+
+# Same for Gemini: the transport whose connection last worked, per API key and
+# timeout, so the preflight and handshakes run once.
+class _GeminiTransport:
+    """A genai client over one httpx client. Threads share it; once it is retired
+    (or was never cached) the last thread to release it closes the httpx client."""
+    __slots__ = ("label", "client", "hclient", "users", "retired")
+
+    def __init__(self, label: str, client, hclient):
+        self.label = label
+        self.client = client
+        self.hclient = hclient
+        self.users = 1  # the thread that built it
+        self.retired = True  # not cached until it has worked once
+
+_GEMINI_CLIENTS: Dict[Tuple[str, int], _GeminiTransport] = {}
+_GEMINI_LOCK = threading.Lock()
+
+def _close_quietly(hclient) -> None:
+    try:
+        hclient.close()
+    except Exception:
+        pass
 
-        timeout_ms = self.timeout * 1000 if self.timeout < 1000 else self.timeout
+def _gemini_release(transport: _GeminiTransport) -> None:
+    with _GEMINI_LOCK:
+        transport.users -= 1
+        close = transport.retired and transport.users <= 0
+    if close:
+        _close_quietly(transport.hclient)
 
-        def _call() -> str:
-            try:
+def _close_gemini_clients() -> None:
+    with _GEMINI_LOCK:
+        for transport in _GEMINI_CLIENTS.values():
+            _close_quietly(transport.hclient)
+        _GEMINI_CLIENTS.clear()
+
+atexit.register(_close_gemini_clients)
+
+class _OpenAIProvider(_ProviderBase):
+    @staticmethod
+    def _messages(system_text: str, user_text: str) -> List[Dict[str, Any]]:
+        return [
+            {"role": "system", "content": system_text},
+            {"role": "user", "content": user_text},
+        ]
+
+    def ask(self, system_text: str, user_text: str) -> str:
+        if openai is None:
+            raise RuntimeError("The OpenAI client library is not installed on the server.")
+
+        def _call(timeout: float) -> str:
+            # openai < 1.0 only exposes the module-level API
+            if not hasattr(openai, "OpenAI"):
+                openai.api_key = self.api_key
                 resp = openai.ChatCompletion.create(
                     model=self.model,
                     temperature=self.temperature,
                     max_tokens=self.max_tokens,
-                    messages=[
-                        {"role": "system", "content": system_text},
-                        {"role": "user", "content": user_text},
-                    ],
-                    request_timeout=timeout_ms,
+                    messages=self._messages(system_text, user_text),
+                    request_timeout=timeout,
                 )
                 txt = resp["choices"][0]["message"]["content"].strip()
                 return txt
-            except AttributeError:
-                client = openai.OpenAI(api_key=self.api_key)
-                r = client.chat.completions.create(
-                    model=self.model,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                    messages=[
-                        {"role": "system", "content": system_text},
-                        {"role": "user", "content": user_text},
-                    ],
-                    timeout=timeout_ms,
-                )
-                return (r.choices[0].message.content or "").strip()
+
+            client = _openai_client(self.api_key)
+            r = client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                messages=self._messages(system_text, user_text),
+                timeout=timeout,
+            )
+            return (r.choices[0].message.content or "").strip()
 
         return self._with_retries(_call)
 
+    def stream(self, system_text: str, user_text: str) -> Iterator[str]:
+        if openai is None:
+            raise RuntimeError("The OpenAI client library is not installed on the server.")
+        if not hasattr(openai, "OpenAI"):
+            yield self.ask(system_text, user_text)
+            return
+
+        client = _openai_client(self.api_key)
+        chunks = client.chat.completions.create(
+            model=self.model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            messages=self._messages(system_text, user_text),
+            timeout=self.timeout,
+            stream=True,
+        )
+        for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
 class _GeminiProvider(_ProviderBase):
     def __init__(self, *args, file_store_id: str = "", **kwargs):
         super().__init__(*args, **kwargs)
         # strip to avoid accidental whitespace in store names
         self.file_store_id = (file_store_id or "").strip()
 
-    def ask(self, system_text: str, user_text: str) -> str:
-        timeout_ms = self.timeout * 1000 if self.timeout < 1000 else self.timeout
-        try:
-            from google import genai
-            from google.genai import types
-            import httpx
-        except Exception:
-            return "The Gemini client library is not installed on the server."
-
-        # Build tools/config once
+    def _content_config(self, system_text: str):
         tools = None
         if self.file_store_id:
             tools = [
-                types.Tool(
-                    file_search=types.FileSearch(
+                genai_types.Tool(
+                    file_search=genai_types.FileSearch(
                         file_search_store_names=[self.file_store_id]
                     )
                 )
             ]
-        cfg = types.GenerateContentConfig(
+        return genai_types.GenerateContentConfig(
             temperature=self.temperature,
             max_output_tokens=self.max_tokens,
             tools=tools,
             system_instruction=system_text or "",
         )
 
-        # Three httpx clients to try in order:
-        clients = []
+    @staticmethod
+    def _http_clients(timeout_s: float) -> Iterator[Tuple[str, Any]]:
+        """Three httpx clients to try in order, built only when the previous one failed."""
+        timeout = httpx.Timeout(timeout_s, connect=5.0)  # httpx takes seconds
 
         # 1) Ignore env proxies/CA, force IPv4, HTTP/1.1
         try:
             transport_ipv4 = httpx.HTTPTransport(local_address="0.0.0.0")  # force IPv4
-            clients.append((
+            yield (
                 "noenv-ipv4-h1",
-                httpx.Client(trust_env=False, http2=False, transport=transport_ipv4, timeout=timeout_ms)
+                httpx.Client(trust_env=False, http2=False, transport=transport_ipv4, timeout=timeout)
             # ignore env
-            ))
+            )
         except Exception as e:
             _logger.warning("Gemini httpx transport build failed (ipv4): %s", e)
 
         # 2) Respect env proxies (if corp proxy is required), still IPv4, HTTP/1.1
         try:
             transport_ipv4_b = httpx.HTTPTransport(local_address="0.0.0.0")
-            clients.append((
+            yield (
                 "env-ipv4-h1",
-                httpx.Client(trust_env=True, http2=False, transport=transport_ipv4_b, timeout=timeout_ms)
-            ))
+                httpx.Client(trust_env=True, http2=False, transport=transport_ipv4_b, timeout=timeout)
+            )
         except Exception as e:
             _logger.warning("Gemini httpx transport build failed (env-ipv4): %s", e)
 
         # 3) Ignore env, default route, HTTP/1.1
-        clients.append((
+        yield (
             "noenv-default-h1",
-            httpx.Client(trust_env=False, http2=False, timeout=timeout_ms)
-        ))
+            httpx.Client(trust_env=False, http2=False, timeout=timeout)
+        )
+
+    def _genai_client(self, label: str, hclient, timeout_ms: int):
+        # Optional preflight to surface handshake issues with exactly this client
+        try:
+            hclient.head("https://generativelanguage.googleapis.com",
+                         timeout=10)  # 404 is fine; handshake must complete
+        except Exception as pre:
+            _logger.warning("Gemini preflight (%s) failed: %s", label, pre)
+            raise
+
+        return genai.Client(
+            api_key=self.api_key or None,
+            http_options=genai_types.HttpOptions(
+                timeout=timeout_ms,  # google-genai takes milliseconds
+                httpx_client=hclient,  # SDK uses this httpx client for all calls
+            ),
+        )
+
+    def _transports(self, timeout_ms: int) -> Iterator[_GeminiTransport]:
+        """The transport that last worked for this key, then fresh ones (preflighted).
+        Each one is handed out acquired: the caller must _gemini_release() it."""
+        with _GEMINI_LOCK:
+            cached = _GEMINI_CLIENTS.get((self.api_key, timeout_ms))
+            if cached:
+                cached.users += 1
+        if cached:
+            yield cached
+        for label, hclient in self._http_clients(self.timeout):
+            try:
+                client = self._genai_client(label, hclient, timeout_ms)
+            except Exception:
+                _close_quietly(hclient)
+                continue
+            yield _GeminiTransport(label, client, hclient)
+
+    def _keep(self, timeout_ms: int, transport: _GeminiTransport) -> None:
+        key = (self.api_key, timeout_ms)
+        with _GEMINI_LOCK:
+            # If another thread cached a transport first, ours stays retired and closes on release
+            if transport.retired and key not in _GEMINI_CLIENTS:
+                _GEMINI_CLIENTS[key] = transport
+                transport.retired = False
+
+    def _discard(self, timeout_ms: int, transport: _GeminiTransport, exc: Exception) -> None:
+        key = (self.api_key, timeout_ms)
+        with _GEMINI_LOCK:
+            # Only a broken connection retires the cached transport; API errors do not.
+            # Threads still using it keep it open until the last one releases it.
+            if isinstance(exc, httpx.TransportError) and _GEMINI_CLIENTS.get(key) is transport:
+                del _GEMINI_CLIENTS[key]
+                transport.retired = True
+
+    def ask(self, system_text: str, user_text: str) -> str:
+        if genai is None:
+            raise RuntimeError("The Gemini client library is not installed on the server.")
+        timeout_ms = int(self.timeout * 1000)
+        cfg = self._content_config(system_text)
+        deadline = time.monotonic() + self.timeout
 
         last_exc = None
-        for label, hclient in clients:
+        for transport in self._transports(timeout_ms):
             try:
-                # Optional preflight to surface handshake issues with exactly this client
                 try:
-                    hclient.head("https://generativelanguage.googleapis.com",
-                                 timeout=10)  # 404 is fine; handshake must complete
-                except Exception as pre:
-                    _logger.warning("Gemini preflight (%s) failed: %s", label, pre)
-                    raise
-
-                client = genai.Client(
-                    api_key=self.api_key or None,
-                    http_options=types.HttpOptions(
-                        timeout=timeout_ms,
-                        httpx_client=hclient,  # SDK uses this httpx client for all calls
-                    ),
-                )
-
-                r = client.models.generate_content(
-                    model=self.model,
-                    contents=user_text,
-                    config=cfg,
-                )
+                    r = transport.client.models.generate_content(
+                        model=self.model,
+                        contents=user_text,
+                        config=cfg,
+                    )
+                except Exception as e:
+                    self._discard(timeout_ms, transport, e)
+                    # API errors (400, 429, ...) would fail the same way on another transport
+                    if not isinstance(e, httpx.TransportError):
+                        raise
+                    last_exc = e
+                    _logger.error("Gemini attempt %s failed: %s", transport.label, e, exc_info=True)
+                    # The caller has given up by now; don't keep dialling on its behalf
+                    if time.monotonic() >= deadline:
+                        break
+                    continue
+                self._keep(timeout_ms, transport)
                 return (getattr(r, "text", None) or "").strip()
-
-            except Exception as e:
-                last_exc = e
-                _logger.error("Gemini attempt %s failed: %s", label, e, exc_info=True)
             finally:
+                _gemini_release(transport)
+
+        # Raise like the OpenAI adapter: error text must never be cached or remembered as an answer
+        raise last_exc or RuntimeError("Gemini request failed")
+
+    def stream(self, system_text: str, user_text: str) -> Iterator[str]:
+        if genai is None:
+            raise RuntimeError("The Gemini client library is not installed on the server.")
+        timeout_ms = int(self.timeout * 1000)
+        cfg = self._content_config(system_text)
+
+        last_exc = None
+        for transport in self._transports(timeout_ms):
+            started = False
+            # finally also runs when the consumer abandons the generator (GeneratorExit)
+            try:
                 try:
-                    hclient.close()
-                except Exception:
-                    pass
+                    for chunk in transport.client.models.generate_content_stream(
+                        model=self.model,
+                        contents=user_text,
+                        config=cfg,
+                    ):
+                        text = getattr(chunk, "text", None)
+                        if text:
+                            started = True
+                            yield text
+                except Exception as e:
+                    self._discard(timeout_ms, transport, e)
+                    # Once text reached the client, falling back would duplicate it;
+                    # API errors would fail the same way on another transport
+                    if started or not isinstance(e, httpx.TransportError):
+                        raise
+                    last_exc = e
+                    _logger.error("Gemini attempt %s failed: %s", transport.label, e, exc_info=True)
+                    continue
+                self._keep(timeout_ms, transport)
+                return
+            finally:
+                _gemini_release(transport)
 
-        # If all attempts failed, return a clear message for the UI
-        return f"Error during Gemini request: {last_exc}"
+        raise last_exc or RuntimeError("Gemini request failed")
 
 def _get_provider(cfg: Dict[str, Any]) -> _ProviderBase:
     if (cfg["provider"] or "").strip().lower() == "gemini":
@@ -282,23 +724,48 @@ AI_DEFAULT_TIMEOUT = 15
 AI_DEFAULT_TEMPERATURE = 0.2
 AI_DEFAULT_MAX_TOKENS = 512
 
-def _get_ai_config() -> Dict[str, Any]:
-    provider = _get_icp_param("website_ai_chat_min.ai_provider", "gemini")
-    api_key = _get_icp_param("website_ai_chat_min.ai_api_key", "")
-    model = _get_icp_param("website_ai_chat_min.ai_model", "")
-    system_prompt = _get_icp_param("website_ai_chat_min.system_prompt", "")
-    docs_folder = _get_icp_param("website_ai_chat_min.docs_folder", "")
-
-    file_search_enabled = _get_icp_param("website_ai_chat_min.file_search_enabled", False)
-    file_store_id = _normalize_store(_get_icp_param("website_ai_chat_min.file_store_id", ""))
-
-    file_search_index = _get_icp_param("website_ai_chat_min.file_search_index", "")
-    allowed_regex = _get_icp_param("website_ai_chat_min.allowed_regex", "")
-    redact_pii = _get_icp_param("website_ai_chat_min.redact_pii", False)
+# Parsed config per database, reused until the settings bump the version param
+CONFIG_VERSION_PARAM = "website_ai_chat_min.config_version"
+_CFG_CACHE: Dict[str, Tuple[str, Dict[str, Any]]] = {}
 
-    temperature = 0.3
-    max_tokens = 1536
-    timeout = 60
+def _get_ai_config() -> Dict[str, Any]:
+    """One ICP read per request; the full config is re-read only after a settings save."""
+    db = request.env.cr.dbname
+    version = _get_icp_param(CONFIG_VERSION_PARAM, "0")
+    hit = _CFG_CACHE.get(db)
+    if hit is None or hit[0] != version:
+        hit = _CFG_CACHE[db] = (version, _read_ai_config())
+    return dict(hit[1])
+
+def _read_ai_config() -> Dict[str, Any]:
+    params = _get_icp_params("website_ai_chat_min.")
+    provider = _get_icp_param("website_ai_chat_min.ai_provider", "gemini", params=params)
+    api_key = _get_icp_param("website_ai_chat_min.ai_api_key", "", params=params)
+    model = _get_icp_param("website_ai_chat_min.ai_model", "", params=params)
+    system_prompt = _get_icp_param("website_ai_chat_min.system_prompt", "", params=params)
+    docs_folder = _get_icp_param("website_ai_chat_min.docs_folder", "", params=params)
+
+    file_search_enabled = _get_icp_param("website_ai_chat_min.file_search_enabled", False, params=params)
+    file_store_id = _normalize_store(_get_icp_param("website_ai_chat_min.file_store_id", "", params=params))
+
+    file_search_index = _get_icp_param("website_ai_chat_min.file_search_index", "", params=params)
+    allowed_regex = _get_icp_param("website_ai_chat_min.allowed_regex", "", params=params)
+    allowed_keywords = frozenset(
+        k.strip().casefold()
+        for k in _get_icp_param("website_ai_chat_min.allowed_keywords", "", params=params).split(",")
+        if k.strip()
+    )
+    redact_pii = _get_icp_param("website_ai_chat_min.redact_pii", False, params=params)
+    cache_enabled = _get_icp_param("website_ai_chat_min.cache_enabled", False, params=params)
+    cache_ttl = max(1, _get_icp_number("website_ai_chat_min.cache_ttl", QA_CACHE_TTL_SECS, params=params))
+    cache_max_entries = max(1, _get_icp_number("website_ai_chat_min.cache_max_entries", QA_CACHE_MAX_ENTRIES, params=params))
+
+    temperature = min(2.0, max(0.0, _get_icp_number("website_ai_chat_min.temperature", AI_DEFAULT_TEMPERATURE, float, params=params)))
+    max_tokens = max(1, _get_icp_number("website_ai_chat_min.max_output_tokens", AI_DEFAULT_MAX_TOKENS, params=params))
+    rate_limit_max = max(1, _get_icp_number("website_ai_chat_min.rate_limit_max", RATE_MAX_CALLS, params=params))
+    rate_limit_window = max(1, _get_icp_number("website_ai_chat_min.rate_limit_window", RATE_WINDOW_SECS, params=params))
+    redis_url = _get_icp_param("website_ai_chat_min.redis_url", "", params=params)
+    timeout = AI_DEFAULT_TIMEOUT  # must stay below the widget's 25 s /ai_chat/send abort
 
     return {
         "provider": provider,
@@ -310,34 +777,37 @@ def _get_ai_config() -> Dict[str, Any]:
         "file_store_id": file_store_id,
         "file_search_index": file_search_index,
         "allowed_regex": allowed_regex,
+        "allowed_keywords": allowed_keywords,
         "redact_pii": redact_pii,
+        "cache_enabled": cache_enabled,
+        "cache_ttl": cache_ttl,
+        "cache_max_entries": cache_max_entries,
         "temperature": temperature,
         "max_tokens": max_tokens,
+        "rate_limit_max": rate_limit_max,
+        "rate_limit_window": rate_limit_window,
+        "redis_url": redis_url,
         "timeout": timeout,
     }
 
 # -----------------------------------------------------------------------------
 # Request parsing (accepts {question} or JSON-RPC)
+def _jsonrequest() -> Dict[str, Any]:
+    """JSON-RPC body as already parsed by Odoo's json dispatcher ({} for type='http')."""
+    payload = getattr(getattr(request, "dispatcher", None), "jsonrequest", None) \
+        or getattr(request, "jsonrequest", None)
+    return payload if isinstance(payload, dict) else {}
+
+def _pick_message(data: Dict[str, Any]) -> str:
+    msg = data.get("message") or data.get("question") or ""
+    return msg.strip() if isinstance(msg, str) else ""
+
 def _normalize_message_from_request(question_param: Optional[str] = None) -> str:
     msg = (question_param or "").strip()
     if msg:
         return msg
-    try:
-        raw = request.httprequest.get_data(cache=False, as_text=True)
-        if raw:
-            payload = json.loads(raw)
-            if isinstance(payload, dict):
-                params = payload.get("params")
-                if isinstance(params, dict):
-                    msg = (params.get("message") or params.get("question") or "").strip()
-                    if msg:
-                        return msg
-                msg = (payload.get("message") or payload.get("question") or "").strip()
-                if msg:
-                    return msg
-    except Exception:
-        pass
-    return ""
+    # Never re-read the body: Odoo has parsed it into request.params already
+    return _pick_message(getattr(request, "params", None) or {}) or _pick_message(_jsonrequest())
 
 # -----------------------------------------------------------------------------
 # Lightweight per-user memory in Odoo session (no DB changes)
@@ -348,40 +818,37 @@ def _mem_bucket_key(cfg: Dict[str, Any]) -> str:
     # isolate memory per provider/model/store
     return f"{(cfg.get('provider') or '').strip()}::{(cfg.get('model') or '').strip()}::{(cfg.get('file_store_id') or '').strip()}"
 
-def _mem_load(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
-    sess = getattr(request, "session", None)
+def _mem_load(cfg: Dict[str, Any], sess=None) -> List[Dict[str, Any]]:
+    sess = sess if sess is not None else getattr(request, "session", None)
     if not sess:
         return []
     bucket = sess.get(_SESSION_MEM_KEY) or {}
     return list(bucket.get(_mem_bucket_key(cfg)) or [])
 
-def _mem_save(cfg: Dict[str, Any], history: List[Dict[str, Any]]) -> None:
-    sess = getattr(request, "session", None)
+def _mem_save(cfg: Dict[str, Any], history: List[Dict[str, Any]], sess=None) -> None:
+    sess = sess if sess is not None else getattr(request, "session", None)
     if not sess:
         return
     bucket = dict(sess.get(_SESSION_MEM_KEY) or {})
     bucket[_mem_bucket_key(cfg)] = history
-    sess[_SESSION_MEM_KEY] = bucket
-    try:
-        sess.modified = True  # ensure persistence
-    except Exception:
-        pass
+    sess[_SESSION_MEM_KEY] = bucket  # item assignment marks the session dirty
 
-def _mem_append(cfg: Dict[str, Any], role: str, text: str, max_msgs: int = 30, max_chars: int = 24000) -> None:
+def _mem_append(cfg: Dict[str, Any], role: str, text: str, max_msgs: int = 30, max_chars: int = 24000,
+                sess=None) -> None:
     """Append a turn and trim for context window."""
-    h = _mem_load(cfg)
+    h = _mem_load(cfg, sess)
     h.append({"role": role, "parts": [{"text": (text or "")[:8000]}]})
     if len(h) > max_msgs:
         h = h[-max_msgs:]
+    # keep the newest turns up to max_chars: one backward scan, one slice
     total = 0
-    trimmed = []
-    for m in reversed(h):
-        part = (m.get("parts") or [{}])[0].get("text") or ""
-        total += len(part)
-        trimmed.append(m)
+    start = len(h)
+    while start > 0:
+        start -= 1
+        total += len((h[start].get("parts") or [{}])[0].get("text") or "")
         if total >= max_chars:
             break
-    _mem_save(cfg, list(reversed(trimmed)))
+    _mem_save(cfg, h[start:], sess)
 
 def _mem_contents(cfg: Dict[str, Any], system_text: str = "") -> List[Dict[str, Any]]:
     """AI has no 'system' role; include system preamble as first user part."""
@@ -391,6 +858,104 @@ def _mem_contents(cfg: Dict[str, Any], system_text: str = "") -> List[Dict[str,
     contents.extend(_mem_load(cfg))
     return contents
 
+# -----------------------------------------------------------------------------
+# Turn pipeline shared by /ai_chat/send and /ai_chat/stream
+def _prepare_turn(question: Optional[str], store: str = "") -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Validate the request and resolve config, cache and memory.
+    Returns (response, {}) when the turn is already answered (rejected or cached),
+    else (None, turn) with everything needed to call the provider.
+    """
+    cfg = _get_ai_config()
+    if not _throttle(cfg):
+        return {"ok": False, "reply": _("Please wait a moment before sending another message.")}, {}
+    if not _user_can_use_chat():
+        return {"ok": False, "reply": _("You are not allowed to use the AI chat.")}, {}
+
+    # Extract payload
+    q = _compact_question(_normalize_message_from_request(question_param=question))
+    if not q:
+        return {"ok": False, "reply": _("Please enter a question.")}, {}
+    if len(q) > 4000:
+        return {"ok": False, "reply": _("Question too long (max 4000 chars).")}, {}
+
+    if not cfg["api_key"]:
+        return {"ok": False, "reply": _("AI provider API key is not configured. Please contact the administrator.")}, {}
+
+    # Optional: per-request store override
+    override_store = _normalize_store(store)
+    if override_store:
+        cfg["file_store_id"] = override_store
+
+    # Respect allow-list (optional): a keyword hit skips the regex engine
+    if (cfg["allowed_keywords"] or cfg["allowed_regex"]) and not _question_in_scope(cfg, q):
+        return {"ok": False, "reply": _("Your question is not within the allowed scope.")}, {}
+
+    outbound_q = _redact_pii(q) if cfg["redact_pii"] else q
+
+    # If File Search isn't enabled, ensure we don't attach a store
+    cfg["file_store_id"] = cfg["file_store_id"] if cfg["file_search_enabled"] else ""
+
+    # Cache lookup (use redacted text as the key if redaction is enabled). The
+    # provider sees the whole session history, so the key must cover it too.
+    cache_key = _qa_cache_key(cfg, outbound_q, _mem_load(cfg)) if cfg["cache_enabled"] else ""
+    cached = _qa_cache_get(cache_key) if cache_key else None
+    if cached:
+        # Keep the session history complete even though no provider call ran
+        _mem_append(cfg, "user", outbound_q)
+        _mem_append(cfg, "model", cached["reply"])
+        return {"ok": True, "reply": cached["reply"], "ui": dict(cached["ui"])}, {}
+
+    # Compose system prompt
+    system_text = _build_system_preamble(cfg["system_prompt"], [])
+
+    # ── MEMORY: remember the user turn and compose multi-turn contents ─────────
+    _mem_append(cfg, "user", outbound_q)
+    contents = _mem_contents(cfg, system_text)
+
+    return None, {
+        "cfg": cfg,
+        "cache_key": cache_key,
+        # Concurrent turns may share one provider call only when their whole
+        # context matches; cache_key already covers config, history and question
+        "coalesce_key": cache_key,
+        "system_text": system_text,
+        "contents": contents,
+        "no_answer": _("(No answer returned.)"),
+        "provider_error": _("Network or provider error. Please try again."),
+        "provider_timeout": _("The AI provider is taking too long to answer. Please try again."),
+    }
+
+def _finish_turn(turn: Dict[str, Any], answer_text: str, sess=None) -> Dict[str, Any]:
+    """Remember the model's reply, shape the UI payload and cache it."""
+    cfg = turn["cfg"]
+    _mem_append(cfg, "model", answer_text, sess=sess)
+
+    # Shape minimal UI (includes ai_status so the frontend can show the active store)
+    ui = {
+        "title": "",
+        "summary": "",
+        "answer_md": answer_text[:1800] if answer_text else "",
+        "citations": [],
+        "suggestions": [],
+        "ai_status": {
+            "provider": cfg["provider"],
+            "model": cfg["model"],
+            "store": cfg["file_store_id"] or None,
+        },
+    }
+
+    if turn["cache_key"] and ui["answer_md"]:
+        _qa_cache_put(turn["cache_key"], {"reply": ui["answer_md"], "ui": dict(ui)},
+                      ttl=cfg["cache_ttl"], max_entries=cfg["cache_max_entries"])
+    return {"ok": True, "reply": (ui["answer_md"] or turn["no_answer"]), "ui": ui}
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    """One Server-Sent Events frame, already encoded (orjson when available)."""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(event) + b"\n\n"
+    return ("data: " + json.dumps(event) + "\n\n").encode("utf-8")
+
 # -----------------------------------------------------------------------------
 # Controller
 class AiChatController(http.Controller):
@@ -398,101 +963,77 @@ class AiChatController(http.Controller):
     @http.route("/ai_chat/can_load", type="json", auth="user", csrf=True, methods=["POST"])
     def can_load(self):
         try:
-            user = request.env.user
-            has_user_group = user.has_group('website_ai_chat_min.group_ai_chat_user')
-            has_admin_group = user.has_group('website_ai_chat_min.group_ai_chat_admin')
-            allowed = bool(has_user_group or has_admin_group)
-            return {"show": allowed}
+            return {"show": _user_can_use_chat()}
         except Exception as e:
             _logger.error("can_load failed: %s", tools.ustr(e), exc_info=True)
             return {"show": False}
 
     @http.route("/ai_chat/send", type="json", auth="user", csrf=True, methods=["POST"])
-    def send(self, question=None):
+    def send(self, question=None, message=None, store=None, **kw):
+        # JSON-RPC params arrive as kwargs: accept the alias and the optional
+        # per-request store override here instead of re-reading the payload
+        override_store = store if isinstance(store, str) else ""
+        if question is None and isinstance(message, str):
+            question = message
 
-        if not _throttle():
-            return {"ok": False, "reply": _("Please wait a moment before sending another message.")}
+        response, turn = _prepare_turn(question, override_store.strip())
+        if response:
+            return response
 
-        # Extract payload
-        q = _normalize_message_from_request(question_param=question)
-        if not q:
-            return {"ok": False, "reply": _("Please enter a question.")}
-        if len(q) > 4000:
-            return {"ok": False, "reply": _("Question too long (max 4000 chars).")}
-
-        cfg = _get_ai_config()
-        if not cfg["api_key"]:
-            return {"ok": False, "reply": _("AI provider API key is not configured. Please contact the administrator.")}
-
-        # Optional: per-request store override
-        override_store = ""
         try:
-            payload = request.jsonrequest or {}
-            if isinstance(payload, dict):
-                override_store = _normalize_store((payload.get("store") or "").strip())
-        except Exception:
-            override_store = ""
-        if override_store:
-            cfg["file_store_id"] = override_store
-
-        # Respect allow-list (optional)
-        if cfg["allowed_regex"] and not _match_allowed(cfg["allowed_regex"], q):
-            return {"ok": False, "reply": _("Your question is not within the allowed scope.")}
-
-        outbound_q = _redact_pii(q) if cfg["redact_pii"] else q
-
-        # Cache lookup (use redacted text as the key if redaction is enabled)
-        cache_key = outbound_q
-        cached = _QA_CACHE.get(cache_key)
-        if cached:
-            ui = dict(cached["ui"])
-            ui.setdefault("ai_status", {
-                "provider": cfg["provider"],
-                "model": cfg["model"],
-                "store": cfg["file_store_id"] if cfg["file_search_enabled"] else None,
-            })
-            return {"ok": True, "reply": cached["reply"], "ui": ui}
-
-        # Compose system prompt
-        system_text = _build_system_preamble(cfg["system_prompt"], [])
-
-        # If File Search isn't enabled, ensure we don't attach a store
-        effective_store = cfg["file_store_id"] if cfg["file_search_enabled"] else ""
-        cfg["file_store_id"] = effective_store
-
-        # ── MEMORY: append user turn, build contents, call, append model turn ─────
-        provider = _get_provider(cfg)
-        try:
-            # 1) remember the new user turn
-            _mem_append(cfg, "user", outbound_q)
-
-            # 2) compose multi-turn contents (system preamble + history)
-            contents = _mem_contents(cfg, system_text)
-
-            # 3) ask with the full contents (Gemini SDK accepts list-of-messages)
-            answer_text = provider.ask(system_text, contents).strip()
-
-            # 4) remember the model's reply
-            _mem_append(cfg, "model", answer_text)
+            # Gemini SDK accepts list-of-messages; turns with the same config,
+            # history and question already in flight on this worker reuse that call's answer
+            provider = _get_provider(turn["cfg"])
+            budget = turn["cfg"]["timeout"]
+            answer_text = _ask_coalesced(
+                turn["coalesce_key"],
+                lambda: _run_with_deadline(lambda: provider.ask(turn["system_text"], turn["contents"]), budget),
+                timeout=budget,
+            ).strip()
+        except FuturesTimeoutError:
+            _logger.warning("provider call exceeded its %ss budget", turn["cfg"]["timeout"])
+            return {"ok": False, "reply": turn["provider_timeout"]}
         except Exception as e:
             _logger.error("provider call failed: %s", tools.ustr(e), exc_info=True)
-            return {"ok": False, "reply": _("Network or provider error. Please try again.")}
-
-        # Shape minimal UI (now includes ai_status so the frontend can show the active store)
-        ui = {
-            "title": "",
-            "summary": "",
-            "answer_md": answer_text[:1800] if answer_text else "",
-            "citations": [],
-            "suggestions": [],
-            "ai_status": {
-                "provider": cfg["provider"],
-                "model": cfg["model"],
-                "store": effective_store or None,
-            },
-        }
-
-        # Cache and return
-        _QA_CACHE[cache_key] = {"reply": ui["answer_md"], "ui": dict(ui)}
-        return {"ok": True, "reply": (ui["answer_md"] or _("(No answer returned.)")), "ui": ui}
+            return {"ok": False, "reply": turn["provider_error"]}
+
+        return _finish_turn(turn, answer_text)
+
+    @http.route("/ai_chat/stream", type="http", auth="user", csrf=True, methods=["POST"])
+    def stream(self, question=None, store=None, **kw):
+        """
+        Same contract as /ai_chat/send, delivered as Server-Sent Events:
+        {"delta": "..."} chunks as the provider generates, then one final
+        {"done": true, ...} event carrying the /ai_chat/send response.
+        """
+        headers = [
+            ("Content-Type", "text/event-stream; charset=utf-8"),
+            ("Cache-Control", "no-cache"),
+            ("X-Accel-Buffering", "no"),  # disable proxy buffering (nginx)
+        ]
+        response, turn = _prepare_turn(question, (store or "").strip())
+        if response:
+            return request.make_response(_sse(dict(response, done=True)), headers=headers)
+
+        # The body is produced after the request has been torn down: keep what
+        # the generator needs and persist the session ourselves at the end.
+        provider = _get_provider(turn["cfg"])
+        sess = request.session
+
+        def _events():
+            # werkzeug sends the headers with the first chunk: flush them now so a
+            # slow first token doesn't look like a dead connection to the widget
+            yield b": ok\n\n"
+            parts: List[str] = []
+            try:
+                for delta in provider.stream(turn["system_text"], turn["contents"]):
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+                result = _finish_turn(turn, "".join(parts).strip(), sess=sess)
+                http.root.session_store.save(sess)
+            except Exception as e:
+                _logger.error("provider stream failed: %s", tools.ustr(e), exc_info=True)
+                result = {"ok": False, "reply": turn["provider_error"]}
+            yield _sse(dict(result, done=True))
 
+        return request.make_response(_events(), headers=headers)
@@ -5,21 +5,26 @@ import logging
 import os
 import time
 import mimetypes
+import re
 
-from odoo import models, fields, api, tools, _
-from odoo.exceptions import (
-    UserError,
-    ValidationError,
-    RedirectWarning,
-    AccessDenied,
-    AccessError,
-    CacheMiss,
-    MissingError,
-)
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..utils import _normalize_store
 
 # Google GenAI (new SDK)
 from google import genai
-from google.genai import types  # kept for compatibility if you reference types elsewhere
+
+# The chat only matches with `regex` (it has a timeout), so validate with the same engine
+try:
+    import regex as regex_engine
+except ImportError:
+    regex_engine = None
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
 
 _logger = logging.getLogger(__name__)
 
@@ -56,10 +61,34 @@ def _guess_mime(path: str) -> str:
     return m
 
 
-def _normalize_store(name: str) -> str:
-    """Ensure we always use a fully-qualified store resource name."""
-    name = (name or "").strip()
-    return name if (not name or name.startswith("fileSearchStores/")) else f"fileSearchStores/{name}"
+# ---------------------------------------------------------------------
+# ReDoS guard for the admin regex (nested quantifiers backtrack exponentially)
+# ---------------------------------------------------------------------
+_REPEAT_OPS = {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"}
+_MAX_REPEATS = 25
+
+
+def _repeat_stats(items, depth=0, stats=None):
+    """Return [max nesting of repeats, repeat count] for a parsed pattern (ignoring ? / {0,1})."""
+    stats = stats if stats is not None else [0, 0]
+    for op, av in items:
+        if str(op) in _REPEAT_OPS:
+            _lo, hi, sub = av
+            # Optional parts ('s?') can't backtrack repeatedly; only real repeats count
+            repeats = hi > 1
+            nested = depth + (1 if repeats else 0)
+            stats[0] = max(stats[0], nested)
+            stats[1] += 1 if repeats else 0
+            _repeat_stats(sub, nested, stats)
+            continue
+        for child in (av if isinstance(av, (tuple, list)) else (av,)):
+            if isinstance(child, sre_parse.SubPattern):
+                _repeat_stats(child, depth, stats)
+            elif isinstance(child, list):  # BRANCH alternatives
+                for alt in child:
+                    if isinstance(alt, sre_parse.SubPattern):
+                        _repeat_stats(alt, depth, stats)
+    return stats
 
 
 class ResConfigSettings(models.TransientModel):
@@ -94,11 +123,30 @@ class ResConfigSettings(models.TransientModel):
         help="Optional system instructions prepended to every conversation.",
         size=4096,
     )
+    ai_max_output_tokens = fields.Integer(
+        string="Max Output Tokens",
+        default=512,
+        config_parameter="website_ai_chat_min.max_output_tokens",
+        help="Upper bound on the length of each reply. Fewer output tokens means faster answers.",
+    )
+    ai_temperature = fields.Float(
+        string="Temperature",
+        default=0.2,
+        config_parameter="website_ai_chat_min.temperature",
+        help="Sampling temperature between 0 and 2. Lower values give more focused answers.",
+    )
     allowed_regex = fields.Char(
         string="Allowed Questions (regex)",
         config_parameter="website_ai_chat_min.allowed_regex",
         help="Only allow questions that match this regular expression (case-insensitive). "
-        "Leave empty to allow all.",
+        "Leave empty to allow all. Requires the Python 'regex' package.",
+        size=1024,
+    )
+    allowed_keywords = fields.Char(
+        string="Allowed Keywords",
+        config_parameter="website_ai_chat_min.allowed_keywords",
+        help="Comma-separated single words; a question containing any of them as a whole word "
+        "is allowed without evaluating the regex (case-insensitive).",
         size=1024,
     )
 
@@ -133,6 +181,13 @@ class ResConfigSettings(models.TransientModel):
         config_parameter="website_ai_chat_min.rate_limit_window",
         help="Duration of the throttle time window in seconds.",
     )
+    redis_url = fields.Char(
+        string="Rate Limit Redis URL",
+        config_parameter="website_ai_chat_min.redis_url",
+        help="Optional redis:// URL to share the rate limit across workers and servers. "
+        "Leave empty to limit per worker.",
+        size=512,
+    )
 
     # Optional features (kept)
     cache_enabled = fields.Boolean(
@@ -142,6 +197,18 @@ class ResConfigSettings(models.TransientModel):
         "to speed up repeated queries.",
         default=False,
     )
+    cache_ttl = fields.Integer(
+        string="Cache Lifetime (sec)",
+        default=600,
+        config_parameter="website_ai_chat_min.cache_ttl",
+        help="How long a cached reply is served before the provider is asked again.",
+    )
+    cache_max_entries = fields.Integer(
+        string="Cache Size",
+        default=2048,
+        config_parameter="website_ai_chat_min.cache_max_entries",
+        help="Maximum number of cached replies kept per server worker (least recently used are dropped).",
+    )
     advanced_router_enabled = fields.Boolean(
         string="Enable Advanced Routing",
         config_parameter="website_ai_chat_min.advanced_router_enabled",
@@ -196,9 +263,54 @@ class ResConfigSettings(models.TransientModel):
             if path.startswith("~") or ".." in path:
                 raise ValidationError(_("Invalid docs folder path. Use an absolute, safe path."))
 
+    def set_values(self):
+        super().set_values()
+        self._bump_config_version()
+
+    @api.constrains("allowed_keywords")
+    def _check_allowed_keywords(self):
+        for rec in self:
+            for keyword in (rec.allowed_keywords or "").split(","):
+                keyword = keyword.strip()
+                # The chat matches whole words, so a phrase or 'e-mail' could never match
+                if keyword and not re.fullmatch(r"\w+", keyword):
+                    raise ValidationError(_(
+                        "Allowed Keywords must be single words separated by commas: %r"
+                    ) % keyword)
+
+    @api.constrains("allowed_regex")
+    def _check_allowed_regex(self):
+        for rec in self:
+            pattern = (rec.allowed_regex or "").strip()
+            if not pattern:
+                continue
+            if regex_engine is None:
+                raise ValidationError(_(
+                    "The 'Allowed Questions' regex needs the Python 'regex' package on the server."
+                ))
+            try:
+                regex_engine.compile(pattern, regex_engine.I | regex_engine.M)
+            except Exception as e:
+                raise ValidationError(_("Invalid 'Allowed Questions' regex: %s") % e)
+            try:
+                nesting, repeats = _repeat_stats(sre_parse.parse(pattern))
+            except Exception:
+                continue  # `regex`-only syntax; matching there runs with a timeout
+            if nesting > 1 or repeats > _MAX_REPEATS:
+                raise ValidationError(_(
+                    "The 'Allowed Questions' regex is too expensive to evaluate: avoid nested "
+                    "quantifiers such as (a+)+ and keep it under %s repetitions."
+                ) % _MAX_REPEATS)
+
     # ---------------------------------------------------------------------
     # Helpers
     # ---------------------------------------------------------------------
+    def _bump_config_version(self):
+        """Tell chat workers to drop their cached copy of the AI settings."""
+        self.env["ir.config_parameter"].sudo().set_param(
+            "website_ai_chat_min.config_version", str(time.time_ns())
+        )
+
     def _resolve_api_key(self) -> str:
         """Prefer the transient field, then ICP, then the environment."""
         self.ensure_one()
@@ -244,7 +356,8 @@ class ResConfigSettings(models.TransientModel):
             raise UserError(_("File not found or not a file: %s") % real_path)
 
         # Preflight size (Gemini File Search limit ~100 MB/file)
-        size_mb = os.path.getsize(real_path) / (1024 * 1024)
+        st = os.stat(real_path)
+        size_mb = st.st_size / (1024 * 1024)
         if size_mb > 100:
             raise UserError(_("The file is %.1f MB which exceeds the 100 MB limit.") % size_mb)
 
@@ -270,11 +383,22 @@ class ResConfigSettings(models.TransientModel):
             # Persist to transient (for immediate UI) and system params (for later use in chat)
             self.write({"file_store_id": store_name,})
             ICP.set_param("website_ai_chat_min.file_store_id", store_name)
+            self._bump_config_version()
 
         # Keep wizard fields in sync if admin typed a bare id
         if self.file_store_id != store_name:
             self.write({"file_store_id": store_name})
 
+        # Skip the upload/import round-trip when this exact revision of the file
+        # was already indexed into the same store (keyed by path, mtime and size).
+        index_sig = "%s:%s:%s:%s" % (store_name, real_path, st.st_mtime_ns, st.st_size)
+        force = self.env.context.get("ai_chat_force_sync")
+        if not force and ICP.get_param("website_ai_chat_min.file_search_index_sig") == index_sig:
+            return self._file_search_notification(
+                _("Unchanged since last sync: %s → %s") % (os.path.basename(real_path), store_name),
+                "info",
+            )
+
         # Determine MIME for logging & explicit Files API config
         mime_type = _guess_mime(real_path)
         _logger.info("Gemini File Search: uploading %s (mime=%s) to store %s", real_path, mime_type, store_name)
@@ -300,14 +424,34 @@ class ResConfigSettings(models.TransientModel):
                 raise UserError(_("Indexing timed out; please retry or check server logs."))
             op = client.operations.get(op)
 
+        # A failed import must stay retryable: only remember revisions that were indexed
+        op_error = getattr(op, "error", None)
+        if op_error:
+            _logger.error("Gemini File Search: import of %s into %s failed: %s", real_path, store_name, op_error)
+            ICP.set_param("website_ai_chat_min.file_search_index_sig", False)
+            return self._file_search_notification(
+                _("Indexing failed for %s: %s") % (os.path.basename(real_path), op_error),
+                "danger",
+            )
+        ICP.set_param("website_ai_chat_min.file_search_index_sig", index_sig)
+
         # Success toast
+        return self._file_search_notification(
+            _("Indexed: %s → %s") % (os.path.basename(real_path), store_name),
+        )
+
+    def file_search_force_upload(self):
+        """Re-upload and re-import even if the file looks unchanged (e.g. it was removed from the store)."""
+        return self.with_context(ai_chat_force_sync=True).file_search_upload()
+
+    def _file_search_notification(self, message: str, notif_type: str = "success") -> dict:
         return {
             "type": "ir.actions.client",
             "tag": "display_notification",
             "params": {
                 "title": _("Gemini File Search"),
-                "message": _("Indexed: %s → %s") % (os.path.basename(real_path), store_name),
+                "message": message,
                 "sticky": False,
-                "type": "success",
+                "type": notif_type,
             },
         }
@@ -198,6 +198,96 @@
     panel.hidden = true;
   });
 
+  // Normalize a /ai_chat/send-shaped result into what appendBotUI expects
+  function toUI(raw) {
+    const uiObj = (raw.ui && typeof raw.ui === "object") ? raw.ui : {};
+    const answerText = uiObj.answer_md || raw.reply || "";
+    return {
+      title: uiObj.title || "",
+      summary: uiObj.summary || "",
+      answer_md: String(answerText || ""),
+      citations: Array.isArray(uiObj.citations) ? uiObj.citations : [],
+      suggestions: Array.isArray(uiObj.suggestions) ? uiObj.suggestions.slice(0, 3) : [],
+    };
+  }
+
+  // ---- STREAMING (Server-Sent Events over fetch) ----
+  // Resolves false when the stream endpoint can't be used (including a failed or
+  // aborted fetch before any response) so the caller can fall back to
+  // /ai_chat/send; throws only once the response body has started.
+  async function sendStream(q) {
+    const csrf = (window.odoo && window.odoo.csrf_token) || "";
+    if (!csrf || !window.ReadableStream || !window.TextDecoder) return false;
+
+    const ctrl = new AbortController();
+    const t = setTimeout(() => ctrl.abort(), 65000);
+    let live = null;
+    let final = null;
+    try {
+      let res;
+      try {
+        res = await fetch("/ai_chat/stream", {
+          method: "POST",
+          credentials: "same-origin",
+          signal: ctrl.signal,
+          headers: { "Accept": "text/event-stream" },
+          body: new URLSearchParams({ question: q, csrf_token: csrf }),
+        });
+      } catch (e) {
+        // The server sends headers at once, so an abort means the turn is already
+        // running there: retrying via /ai_chat/send would record it twice
+        if (e && e.name === "AbortError") {
+          appendMessage("bot", "The AI provider is taking too long to answer. Please try again.");
+          return true;
+        }
+        console.warn("AI Chat: stream unavailable, falling back", e);
+        return false;
+      }
+      const isSSE = (res.headers.get("content-type") || "").includes("text/event-stream");
+      if (!res.ok || !isSSE || !res.body) return false;
+
+      live = document.createElement("div");
+      live.className = "ai-chat-min__msg bot";
+      body.appendChild(live);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buf.indexOf("\n\n")) !== -1) {
+          const frame = buf.slice(0, sep);
+          buf = buf.slice(sep + 2);
+          if (!frame.startsWith("data: ")) continue;
+          const ev = JSON.parse(frame.slice(6));
+          if (ev.done) {
+            final = ev;
+          } else if (ev.delta) {
+            // Append a text node per delta; resetting textContent would re-layout the whole reply each time
+            live.append(ev.delta);
+            body.scrollTop = body.scrollHeight;
+          }
+        }
+      }
+
+      live.remove();
+      live = null;
+      if (final && final.ok) {
+        appendBotUI(toUI(final));
+      } else {
+        appendMessage("bot", (final && final.reply) || "Network error.");
+      }
+      return true;
+    } finally {
+      clearTimeout(t);
+      // Aborted mid-stream: don't leave the partial answer above the error message
+      if (live && !final) live.remove();
+    }
+  }
+
   // ---- SEND FLOW ----
   async function sendMsg() {
     const q = (input.value || "").trim();
@@ -207,6 +297,8 @@
     send.disabled = true;
 
     try {
+      if (await sendStream(q)) return;
+
       const { ok, status, data } = await fetchJSON("/ai_chat/send", {
         method: "POST",
         body: { jsonrpc: "2.0", method: "call", params: { question: q } },
@@ -222,16 +314,7 @@
 
       const raw = unwrap(data || {});
       if (ok && raw && raw.ok) {
-        const uiObj = (raw.ui && typeof raw.ui === "object") ? raw.ui : {};
-        const answerText = uiObj.answer_md || raw.reply || "";
-        const ui = {
-          title: uiObj.title || "",
-          summary: uiObj.summary || "",
-          answer_md: String(answerText || ""),
-          citations: Array.isArray(uiObj.citations) ? uiObj.citations : [],
-          suggestions: Array.isArray(uiObj.suggestions) ? uiObj.suggestions.slice(0, 3) : [],
-        };
-        appendBotUI(ui);
+        appendBotUI(toUI(raw));
       } else {
         appendMessage("bot", (raw && raw.reply) || "Network error.");
       }
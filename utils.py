@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# Helpers shared by the chat controller and the settings model (no SDK imports)
+
+_STORE_PREFIX = "fileSearchStores/"
+
+
+def _normalize_store(name: str) -> str:
+    """Ensure we always use a fully-qualified store resource name."""
+    name = name.strip() if name else ""
+    if not name or name.startswith(_STORE_PREFIX):
+        return name
+    return _STORE_PREFIX + name